@@ -1 +1 @@
-__all__ = ['config','io','listing','details','pipeline','cli']
+__all__ = ['config','io','net','listing','details','pipeline','cli']
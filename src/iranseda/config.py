@@ -6,10 +6,10 @@ import yaml
 
 @dataclass
 class Outputs:
-    ids_csv: str = "audiobooks.csv"
-    books_csv: str = "books_with_attid.csv"
-    errors_csv: str = "errors.csv"
-    jsonl: str = "books_with_attid.jsonl"
+    ids_csv: Path = Path("audiobooks.csv")
+    books_csv: Path = Path("books_with_attid.csv")
+    errors_csv: Path = Path("errors.csv")
+    jsonl: Path = Path("books_with_attid.jsonl")
 
 @dataclass
 class Throttle:
@@ -23,17 +23,18 @@ class Filters:
 
 @dataclass
 class Parallel:
-    workers: int = 2
+    workers: int = 2       # I/O threads
+    cpu_workers: int = 0   # HTML-parsing processes; 0 = parse in the I/O threads
 
 @dataclass
 class Logging:
     level: str = "INFO"
-    file: str | None = "iranseda.log"
+    file: Path | None = Path("iranseda.log")
 
 @dataclass
 class CacheCfg:
     enabled: bool = True
-    dir: str = ".cache/details"
+    dir: Path = Path(".cache/details")
 
 @dataclass
 class Settings:
@@ -48,12 +49,15 @@ class Settings:
 
 def load_config(path: str | Path) -> Settings:
     data = yaml.safe_load(Path(path).read_text(encoding="utf-8"))
-    outputs = Outputs(**(data.get("outputs") or {}))
+    outputs = Outputs(**{k: Path(v) for k, v in (data.get("outputs") or {}).items()})
     throttle = Throttle(**(data.get("throttle") or {}))
     filters = Filters(**(data.get("filters") or {}))
     parallel = Parallel(**(data.get("parallel") or {}))
     logging = Logging(**(data.get("logging") or {}))
+    if logging.file:
+        logging.file = Path(logging.file)
     cache = CacheCfg(**(data.get("cache") or {}))
+    cache.dir = Path(cache.dir)
     return Settings(
         start_url_template=data["start_url_template"],
         pages=int(data["pages"]),
@@ -2,16 +2,15 @@
 from __future__ import annotations
 import re
 from typing import Dict, List, Any
-from urllib.parse import urljoin, urlparse, parse_qs
 
+import orjson
 import requests
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
 
-from .utils import retry
+from . import net
+from .utils import retry, fix_url
 
-BASE = "https://book.iranseda.ir/"
 API  = "https://apisec.iranseda.ir/book/Details/?VALID=TRUE&g={g}&attid={attid}"
-HEADERS = {"User-Agent": "Mozilla/5.0", "Accept-Language": "fa,en;q=0.8"}
 
 CSV_FIELDS = [
     "AudioBook_ID","AudioBook_attID","Book_Title","Book_Description","Book_Detail",
@@ -21,14 +20,28 @@ CSV_FIELDS = [
     "Cover_Image_URL","Source_URL","Player_Link","FullBook_MP3_URL","All_MP3s_Found"
 ]
 
-def fix_url(u: str) -> str:
-    u = u.strip()
-    if u.startswith("http"): return u
-    return urljoin(BASE, u.lstrip("./"))
+# field -> ordered (source, label) fallbacks; "item" = .item-info, "tags" = #tags metadata list
+FIELD_SOURCES = {
+    "Book_Author":        (("item", "نویسنده"), ("tags", "عنوان كتاب مرجع"), ("tags", "نویسنده")),
+    "Book_Translator":    (("tags", "ترجمه"),),
+    "Book_Narrator":      (("tags", "راوی"),),
+    "Book_Director":      (("item", "کارگردان"), ("tags", "کارگردان")),
+    "Book_Producer":      (("tags", "تهیه‌کننده"),),
+    "Book_SoundEngineer": (("tags", "صدابردار"),),
+    "Book_Effector":      (("tags", "افکتور"), ("tags", "افكتور")),
+    "Book_Actors":        (("tags", "بازیگران"),),
+    "Book_Genre":         (("tags", "کلمه کلیدی"), ("tags", "نوع متن")),
+    "Book_Category":      (("tags", "دسته بندی ها"), ("item", "دسته‌بندی")),
+}
+
+_ATTID_RE = re.compile(r"[?&]attid=(\d+)", re.I)
+_DUR_RE = re.compile(r"(\d{1,2}:\d{2}:\d{2}|\d{1,3}:\d{2})")
+_INT_RE = re.compile(r"(\d+)")
+_URL_G_RE = re.compile(r"[?&]g=(\d+)")
 
 @retry(max_attempts=3, base_delay=0.6)
 def req_get(url: str) -> requests.Response:
-    r = requests.get(url, headers=HEADERS, timeout=25)
+    r = net.SESSION.get(url, timeout=25)
     if not r.encoding or r.encoding.lower() in ("iso-8859-1", "ascii"):
         r.encoding = r.apparent_encoding or "utf-8"
     if r.status_code in (429, 403, 408):
@@ -37,83 +50,107 @@ def req_get(url: str) -> requests.Response:
         raise RuntimeError(f"server error {r.status_code}")
     return r
 
+def get_text(node, sep: str = "") -> str:
+    """Like bs4's get_text(sep, strip=True): stripped, non-empty text nodes joined by `sep`."""
+    parts = node.text(separator="\0", strip=True).split("\0")
+    return sep.join(p for p in parts if p)
+
+def next_sibling_tag(node, tag: str):
+    sib = node.next
+    while sib is not None and sib.tag != tag:
+        sib = sib.next
+    return sib
+
 def text_or_none(el):
-    if not el: return None
-    txt = el.get_text(" ", strip=True)
+    if el is None: return None
+    txt = get_text(el, " ")
     return txt if txt else None
 
-def parse_label_from_iteminfo(soup, label_fa):
-    for dd in soup.select(".item-info dd.field"):
-        strong = dd.find("strong")
-        if strong and label_fa in strong.get_text(strip=True):
-            items = [t.get_text(" ", strip=True) for t in dd.find_all(["a","span"])]
+def index_iteminfo(tree):
+    """Single pass over `.item-info dd.field` -> [(strong text, a/span texts, dd text)]."""
+    out = []
+    for dd in tree.css(".item-info dd.field"):
+        strong = dd.css_first("strong")
+        key = get_text(strong) if strong is not None else ""
+        items = [get_text(t, " ") for t in dd.css("a, span")]
+        out.append((key, items, get_text(dd, " ")))
+    return out
+
+def index_metadata_list(tree):
+    """Single pass over `#tags dt` -> [(dt text, span values of next dd, dd text)]."""
+    out = []
+    for dt in tree.css("#tags dt"):
+        dd = next_sibling_tag(dt, "dd")
+        if dd is not None:
+            vals = [get_text(sp, " ") for sp in dd.css("span")]
+            vals = [v for v in vals if v and v != ","]
+            out.append((get_text(dt), vals, get_text(dd, " ")))
+        else:
+            out.append((get_text(dt), [], None))
+    return out
+
+def parse_label_from_iteminfo(iteminfo, label_fa):
+    for key, items, _ in iteminfo:
+        if label_fa in key:
             items = [t for t in items if t and t != label_fa]
             return "، ".join(dict.fromkeys(items)) or None
     return None
 
-def parse_from_metadata_list(soup, dt_text):
-    for dt in soup.select("#tags dt"):
-        if dt_text in dt.get_text(strip=True):
-            dd = dt.find_next_sibling("dd")
-            if dd:
-                vals = [sp.get_text(" ", strip=True) for sp in dd.select("span")]
-                vals = [v for v in vals if v and v != ","]
-                if vals:
-                    return "، ".join(dict.fromkeys(vals))
+def parse_from_metadata_list(tags, dt_text):
+    for key, vals, _ in tags:
+        if dt_text in key and vals:
+            return "، ".join(dict.fromkeys(vals))
     return None
 
-def get_og_image(soup):
-    tag = soup.find("meta", attrs={"property": "og:image"})
-    if tag and (tag.get("content") or tag.get("value")):
-        return fix_url(tag.get("content") or tag.get("value"))
+def get_og_image(tree):
+    tag = tree.css_first('meta[property="og:image"]')
+    if tag is not None:
+        val = tag.attributes.get("content") or tag.attributes.get("value")
+        if val:
+            return fix_url(val)
     return None
 
-def find_first_image_src(soup):
-    img = soup.select_one(".product-view .item .image img") or soup.select_one(".cover img") or soup.find("img")
-    if img and img.has_attr("src"):
-        return fix_url(img["src"])
+def find_first_image_src(tree):
+    img = tree.css_first(".product-view .item .image img") or tree.css_first(".cover img") or tree.css_first("img")
+    if img is not None and "src" in img.attributes:
+        return fix_url(img.attributes["src"] or "")
     return None
 
-def extract_attid(soup):
-    og = get_og_image(soup)
+def extract_attid(tree, og=None):
+    og = og or get_og_image(tree)
     if og:
-        m = re.search(r"[?&]AttID=(\d+)", og, re.I)
+        m = _ATTID_RE.search(og)
         if m: return int(m.group(1))
-    for img in soup.find_all("img", src=True):
-        m = re.search(r"[?&]AttID=(\d+)", img["src"], re.I)
+    for img in tree.css("img[src]"):
+        m = _ATTID_RE.search(img.attributes["src"] or "")
         if m: return int(m.group(1))
-    for a in soup.find_all("a", href=True):
-        m = re.search(r"[?&]attid=(\d+)", a["href"], re.I)
+    for a in tree.css("a[href]"):
+        m = _ATTID_RE.search(a.attributes["href"] or "")
         if m: return int(m.group(1))
     return None
 
-def parse_duration_and_episodes(soup):
+def parse_duration_and_episodes(iteminfo, tags):
     dur = None; ep = None
     dur_keys = ["مدت", "مدت زمان", "زمان"]
     ep_keys  = ["تعداد قسمت", "تعداد قطعه", "تعداد قطعات", "تعداد قسمت‌ها"]
-    for dd in soup.select(".item-info dd.field"):
-        s = dd.get_text(" ", strip=True)
+    for _, _, s in iteminfo:
         for k in dur_keys:
             if k in s and not dur:
-                m = re.search(r"(\d{1,2}:\d{2}:\d{2}|\d{1,3}:\d{2})", s)
+                m = _DUR_RE.search(s)
                 if m: dur = m.group(1)
         for k in ep_keys:
             if k in s and not ep:
-                m = re.search(r"(\d+)", s)
+                m = _INT_RE.search(s)
                 if m: ep = int(m.group(1))
-    for dt in soup.select("#tags dt"):
-        t = dt.get_text(strip=True)
+    for t, _, s in tags:
+        if s is None:
+            continue
         if any(k in t for k in dur_keys) and not dur:
-            dd = dt.find_next_sibling("dd")
-            if dd:
-                s = dd.get_text(" ", strip=True)
-                m = re.search(r"(\d{1,2}:\d{2}:\d{2}|\d{1,3}:\d{2})", s)
-                if m: dur = m.group(1)
+            m = _DUR_RE.search(s)
+            if m: dur = m.group(1)
         if any(k in t for k in ep_keys) and not ep:
-            dd = dt.find_next_sibling("dd")
-            if dd:
-                m = re.search(r"(\d+)", dd.get_text(" ", strip=True))
-                if m: ep = int(m.group(1))
+            m = _INT_RE.search(s)
+            if m: ep = int(m.group(1))
     return dur, ep
 
 def build_player_link(audio_id, attid):
@@ -122,42 +159,57 @@ def build_player_link(audio_id, attid):
     return None
 
 def parse_details_page(html: str, url: str) -> Dict[str, Any]:
-    soup = BeautifulSoup(html, "html.parser")
+    tree = LexborHTMLParser(html)
     data: Dict[str, Any] = {}
-    data["Book_Title"] = text_or_none(soup.select_one("h1.titel"))
-    data["Book_Description"] = text_or_none(soup.select_one("#about .body-module"))
-    data["Book_Detail"] = text_or_none(soup.select_one("#review .body-module .more")) or text_or_none(soup.select_one("#review .body-module"))
-    lang = soup.find("meta", {"property":"og:locale"})
-    data["Book_Language"] = "فارسی" if (lang and "fa" in lang.get("content","")) else None
+    data["Book_Title"] = text_or_none(tree.css_first("h1.titel"))
+    data["Book_Description"] = text_or_none(tree.css_first("#about .body-module"))
+    data["Book_Detail"] = text_or_none(tree.css_first("#review .body-module .more")) or text_or_none(tree.css_first("#review .body-module"))
+    lang = tree.css_first('meta[property="og:locale"]')
+    data["Book_Language"] = "فارسی" if (lang is not None and "fa" in (lang.attributes.get("content") or "")) else None
     data["Book_Country"] = None
-    data["Book_Author"]        = parse_label_from_iteminfo(soup, "نویسنده") or parse_from_metadata_list(soup, "عنوان كتاب مرجع") or parse_from_metadata_list(soup, "نویسنده")
-    data["Book_Translator"]    = parse_from_metadata_list(soup, "ترجمه")
-    data["Book_Narrator"]      = parse_from_metadata_list(soup, "راوی")
-    data["Book_Director"]      = parse_label_from_iteminfo(soup, "کارگردان") or parse_from_metadata_list(soup, "کارگردان")
-    data["Book_Producer"]      = parse_from_metadata_list(soup, "تهیه‌کننده")
-    data["Book_SoundEngineer"] = parse_from_metadata_list(soup, "صدابردار")
-    data["Book_Effector"]      = parse_from_metadata_list(soup, "افکتور") or parse_from_metadata_list(soup, "افكتور")
-    data["Book_Actors"]        = parse_from_metadata_list(soup, "بازیگران")
-    data["Book_Genre"]         = parse_from_metadata_list(soup, "کلمه کلیدی") or parse_from_metadata_list(soup, "نوع متن")
-    data["Book_Category"]      = parse_from_metadata_list(soup, "دسته بندی ها") or parse_label_from_iteminfo(soup, "دسته‌بندی")
-    dur_txt, ep_cnt = parse_duration_and_episodes(soup)
+    iteminfo = index_iteminfo(tree)
+    tags = index_metadata_list(tree)
+    lookup = {"item": parse_label_from_iteminfo, "tags": parse_from_metadata_list}
+    sources = {"item": iteminfo, "tags": tags}
+    for field, chain in FIELD_SOURCES.items():
+        data[field] = None
+        for src, label in chain:
+            val = lookup[src](sources[src], label)
+            if val:
+                data[field] = val
+                break
+    dur_txt, ep_cnt = parse_duration_and_episodes(iteminfo, tags)
     data["Book_Duration"] = dur_txt
     data["Episode_Count"] = ep_cnt
-    cover = get_og_image(soup) or find_first_image_src(soup)
+    og = get_og_image(tree)
+    cover = og or find_first_image_src(tree)
     data["Cover_Image_URL"] = cover
-    data["AudioBook_attID"] = extract_attid(soup)
-    try:
-        q = parse_qs(urlparse(url).query)
-        g = q.get("g", [None])[0]
-        data["AudioBook_ID"] = int(g) if g else None
-    except Exception:
-        data["AudioBook_ID"] = None
+    data["AudioBook_attID"] = extract_attid(tree, og)
+    m = _URL_G_RE.search(url)
+    data["AudioBook_ID"] = int(m.group(1)) if m else None
     data["Source_URL"] = url
     data["Player_Link"] = None
     data["FullBook_MP3_URL"] = None
     data["All_MP3s_Found"] = None
     return data
 
+def pick_mp3s(mp3s, min_size: int = 0):
+    """One pass over `mp3s` >= `min_size` bytes: (largest / highest-bitrate entry or None, unique URLs in order)."""
+    best = None; best_key = (-1, -1)
+    urls: List[str] = []
+    seen = set()
+    for m in mp3s:
+        size = m["size"]
+        if size < min_size:
+            continue
+        u = m["url"]
+        if u not in seen:
+            seen.add(u); urls.append(u)
+        k = (size, m["bitrate"])
+        if k > best_key:
+            best_key, best = k, m
+    return best, urls
+
 @retry(max_attempts=3, base_delay=0.6)
 def get_mp3s_from_api(audio_id: int, attid: int):
     url = API.format(g=audio_id, attid=attid)
@@ -165,16 +217,20 @@ def get_mp3s_from_api(audio_id: int, attid: int):
     if r.status_code != 200:
         return []
     try:
-        j = r.json()
-    except Exception:
-        return []
+        j = orjson.loads(r.content)
+    except orjson.JSONDecodeError:
+        # e.g. a BOM-prefixed or non-UTF-8 body; requests sniffs the encoding
+        try:
+            j = r.json()
+        except ValueError:
+            return []
     mp3s = []
     for it in (j.get("items") or []):
         for d in (it.get("download") or []):
             if str(d.get("extension")).lower() == "mp3" and d.get("downloadUrl"):
                 mp3s.append({
                     "url": fix_url(d["downloadUrl"]),
-                    "bitrate": d.get("bitRate"),
+                    "bitrate": int(d.get("bitRate") or 0),
                     "size": int(d.get("fileSize") or 0),
                     "attid": it.get("FileID"),
                 })
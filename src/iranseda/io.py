@@ -8,16 +8,62 @@ def atomic_write_csv(csv_path: Path, rows: Iterable[Dict], fieldnames: List[str]
     with tmp.open("w", newline="", encoding="utf-8-sig") as f:
         w = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
         w.writeheader()
-        for row in rows:
-            w.writerow(row)
+        w.writerows(rows)
         f.flush()
     tmp.replace(csv_path)
 
-def ensure_error_csv(path: Path):
+def load_rows_by_id(csv_path: Path, key: str = "AudioBook_ID") -> Dict[int, Dict]:
+    rows: Dict[int, Dict] = {}
+    with csv_path.open(newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            if row.get(key):
+                rows[int(float(row[key]))] = row
+    return rows
+
+def ensure_error_csv(path: Path, buffering: int = -1):
     newfile = not path.exists()
-    f = path.open("a", newline="", encoding="utf-8-sig")
+    f = path.open("a", newline="", encoding="utf-8-sig", buffering=buffering)
     writer = csv.DictWriter(f, fieldnames=["AudioBook_ID","URL","Error"])
     if newfile:
         writer.writeheader()
         f.flush()
     return f, writer
+
+class CheckpointedCsv:
+    """Append rows to `csv_path` as they arrive and consolidate `rows` into it
+    with an atomic rewrite every `checkpoint_every` rows (and on close)."""
+
+    def __init__(self, csv_path: Path, fieldnames: List[str], rows: Dict[int, Dict], checkpoint_every: int = 200):
+        self.csv_path = csv_path
+        self.fieldnames = fieldnames
+        self.rows = rows
+        self.checkpoint_every = checkpoint_every
+        self._since = 0
+        self._open()
+
+    def _open(self) -> None:
+        newfile = not self.csv_path.exists() or self.csv_path.stat().st_size == 0
+        self._f = self.csv_path.open("a", newline="", encoding="utf-8-sig")
+        self._writer = csv.DictWriter(self._f, fieldnames=self.fieldnames, extrasaction="ignore")
+        if newfile:
+            self._writer.writeheader()
+
+    def add(self, key: int, row: Dict) -> None:
+        self.rows[key] = row
+        self._writer.writerow(row)
+        # hand the row to the OS right away so a killed run keeps it (no fsync)
+        self._f.flush()
+        self._since += 1
+        if self.checkpoint_every and self._since >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self) -> None:
+        self._f.close()
+        atomic_write_csv(self.csv_path, self.rows.values(), self.fieldnames)
+        self._since = 0
+        self._open()
+
+    def close(self) -> None:
+        self._f.close()
+        if self._since:
+            atomic_write_csv(self.csv_path, self.rows.values(), self.fieldnames)
@@ -0,0 +1,50 @@
+from __future__ import annotations
+import re
+from datetime import timedelta
+from pathlib import Path
+
+import requests
+import requests_cache
+from requests.adapters import HTTPAdapter
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "Accept-Language": "fa,en;q=0.8",
+    # brotli is decoded by urllib3 when the `brotli` package is installed
+    "Accept-Encoding": "br, gzip, deflate",
+    "Connection": "keep-alive",
+}
+
+# Detail pages already live in DiskCache; listing pages are revalidated on
+# every request (ETag/Last-Modified -> 304) and API answers kept for a while.
+HTTP_CACHE_EXPIRY = {
+    re.compile(r"/DetailsAlbum/", re.I): requests_cache.DO_NOT_CACHE,
+    "apisec.iranseda.ir": timedelta(hours=12),
+}
+
+def build_session(workers: int = 1, cache_dir: Path | None = None) -> requests.Session:
+    """Create the shared keep-alive session (pool sized for `workers`) and install it as `SESSION`.
+
+    With `cache_dir`, responses go through an HTTP cache (`<cache_dir>/http.sqlite`)
+    that honours Cache-Control and conditional GETs.
+    """
+    global SESSION
+    if cache_dir:
+        s = requests_cache.CachedSession(
+            cache_name=str(Path(cache_dir) / "http"),
+            backend="sqlite",
+            cache_control=True,
+            allowable_codes=(200,),
+            expire_after=requests_cache.EXPIRE_IMMEDIATELY,
+            urls_expire_after=HTTP_CACHE_EXPIRY,
+        )
+    else:
+        s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max(workers, 8), pool_maxsize=max(workers, 32), max_retries=0)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers.update(HEADERS)
+    SESSION = s
+    return s
+
+SESSION: requests.Session = build_session()
@@ -1,14 +1,97 @@
 from __future__ import annotations
 from pathlib import Path
-from typing import Dict, Any, Tuple, List
-import logging, json, csv
+from typing import Dict, Any, Tuple, List, Iterable, Callable
+import logging, csv
+from functools import partial
 
-import pandas as pd
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import orjson
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 
-from . import listing, details, io
-from .utils import throttle, setup_logging, DiskCache
+from . import listing, details, io, net
+from .utils import setup_logging, DiskCache, RateLimiter
 
+__all__ = ["run_pipeline"]
+
+ERROR_FIELDS = ["AudioBook_ID", "URL", "Error"]
+
+
+def _iter_completed(ex: ThreadPoolExecutor, fn: Callable, items: Iterable, window: int):
+    """Yield fn(item) results as they finish, keeping at most `window` tasks in flight."""
+    it = iter(items)
+    pending = set()
+    for item in it:
+        pending.add(ex.submit(fn, item))
+        if len(pending) >= window:
+            break
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            nxt = next(it, None)
+            if nxt is not None:
+                pending.add(ex.submit(fn, nxt))
+            yield fut.result()
+
+def _process_one(
+    item: Tuple[int, str],
+    *,
+    min_mp3_size_bytes: int,
+    require_full_mp3: bool,
+    cache: DiskCache | None,
+    limiter: RateLimiter | None = None,
+    cpu_pool: ProcessPoolExecutor | None = None,
+):
+    """Fetch, parse and enrich one (audio_id, url); returns (status, audio_id, msg, record)."""
+    audio_id, url = item
+    try:
+        html = cache.get(url) if cache else None
+        # one request slot per book (detail page and/or API call)
+        if limiter:
+            limiter.wait()
+        if not html:
+            resp = details.req_get(url)
+            if resp.status_code != 200:
+                raise RuntimeError(f"HTTP {resp.status_code}")
+            html = resp.text
+            if cache:
+                cache.set(url, html)
+
+        if cpu_pool:
+            parsed = cpu_pool.submit(details.parse_details_page, html, url).result()
+        else:
+            parsed = details.parse_details_page(html, url)
+        if not parsed.get("AudioBook_ID"):
+            parsed["AudioBook_ID"] = audio_id
+
+        attid = parsed.get("AudioBook_attID")
+        parsed["Player_Link"] = details.build_player_link(
+            parsed.get("AudioBook_ID"), attid
+        )
+
+        # MP3s via official API
+        mp3s = (
+            details.get_mp3s_from_api(parsed.get("AudioBook_ID"), attid)
+            if (parsed.get("AudioBook_ID") and attid)
+            else []
+        )
+        best, urls = details.pick_mp3s(mp3s, min_mp3_size_bytes)
+        if require_full_mp3 and best is None:
+            return ("skipped", audio_id, "no mp3 meets filters", parsed)
+
+        parsed["FullBook_MP3_URL"] = best["url"] if best else None
+        parsed["All_MP3s_Found"] = ", ".join(urls) if urls else None
+
+        # minimal completeness validation:
+        if not parsed.get("Book_Title") or not parsed.get("Player_Link"):
+            return (
+                "err",
+                audio_id,
+                "parsed record incomplete (missing title/player)",
+                parsed,
+            )
+
+        return ("ok", audio_id, None, parsed)
+    except Exception as e:
+        return ("err", audio_id, str(e), {"AudioBook_ID": audio_id, "Source_URL": url})
 
 def run_pipeline(
     start_url: str,
@@ -25,11 +108,18 @@ def run_pipeline(
     log_file: Path | None,
     log_level: str,
     cache_dir: Path | None,
+    checkpoint_every: int = 200,
+    cpu_workers: int = 0,
+    force_refresh: bool = False,
 ):
     """
     Full pipeline: crawl IDs in-memory -> enrich -> write CSV/JSONL
     - Skips incomplete rows (Book_Title/Player_Link empty) -> goes to errors.csv
     - After pass 1, runs up to 2 sweep passes over errors.csv with stronger backoff
+    - `workers` threads do the HTTP I/O; with `cpu_workers` > 0 the HTML parsing
+      is handed to a process pool of that size so it does not hold the GIL
+    - IDs already in books_csv with a FullBook_MP3_URL are not fetched again
+      unless `force_refresh` is set
     """
     # ---- logging + dirs ----
     setup_logging(log_file, log_level)
@@ -37,221 +127,170 @@ def run_pipeline(
 
     for p in [books_csv, errors_csv, jsonl_path]:
         p.parent.mkdir(parents=True, exist_ok=True)
-    if cache_dir:
-        Path(cache_dir).mkdir(parents=True, exist_ok=True)
-
     cache = DiskCache(cache_dir) if cache_dir else None
+    cpu_pool = ProcessPoolExecutor(max_workers=cpu_workers) if cpu_workers > 0 else None
+    net.build_session(workers, cache_dir)
 
     # ---- crawl listing pages (in-memory) ----
-    pairs: List[Tuple[int, str]] = listing.crawl_taglist(start_url, pages)
-    log.info(f"[crawl] collected {len(pairs)} IDs (pages 1..{pages})")
+    pairs: List[Tuple[int, str]] = listing.crawl_taglist(start_url, pages, workers)
+    log.info("[crawl] collected %d IDs (pages 1..%d)", len(pairs), pages)
 
     # ---- merge existing CSV if present (so we overwrite by AudioBook_ID) ----
     merged: Dict[int, Dict[str, Any]] = {}
     if books_csv.exists():
         try:
-            df_prev = pd.read_csv(books_csv, encoding="utf-8-sig")
-            for _, r in df_prev.iterrows():
-                if "AudioBook_ID" in r and pd.notna(r["AudioBook_ID"]):
-                    merged[int(r["AudioBook_ID"])] = dict(r)
-            log.info(f"[merge] loaded {len(merged)} existing rows from {books_csv.name}")
+            merged = io.load_rows_by_id(books_csv)
+            log.info("[merge] loaded %d existing rows from %s", len(merged), books_csv.name)
         except Exception as e:
-            log.warning(f"[merge] failed to load existing CSV: {e}")
-
-    # ---- helper: process a single item ----
-    def _process_one(
-        item: Tuple[int, str],
-        *,
-        min_mp3_size_bytes: int,
-        require_full_mp3: bool,
-        cache: DiskCache | None,
-    ):
-        audio_id, url = item
-        try:
-            html = cache.get(url) if cache else None
-            if not html:
-                resp = details.req_get(url)
-                if resp.status_code != 200:
-                    raise RuntimeError(f"HTTP {resp.status_code}")
-                html = resp.text
-                if cache:
-                    cache.set(url, html)
+            log.warning("[merge] failed to load existing CSV: %s", e)
 
-            parsed = details.parse_details_page(html, url)
-            if not parsed.get("AudioBook_ID"):
-                parsed["AudioBook_ID"] = audio_id
-
-            attid = parsed.get("AudioBook_attID")
-            parsed["Player_Link"] = details.build_player_link(
-                parsed.get("AudioBook_ID"), attid
-            )
-
-            # MP3s via official API
-            mp3s = (
-                details.get_mp3s_from_api(parsed.get("AudioBook_ID"), attid)
-                if (parsed.get("AudioBook_ID") and attid)
-                else []
-            )
-            mp3s = [m for m in mp3s if (m.get("size") or 0) >= min_mp3_size_bytes]
-            if require_full_mp3 and not mp3s:
-                return ("skipped", audio_id, "no mp3 meets filters", parsed)
-
-            if mp3s:
-                best = max(
-                    mp3s,
-                    key=lambda m: (m.get("size") or 0, int(m.get("bitrate") or 0)),
-                )
-                parsed["FullBook_MP3_URL"] = best["url"]
-                parsed["All_MP3s_Found"] = ", ".join(
-                    dict.fromkeys([m["url"] for m in mp3s])
-                )
-            else:
-                parsed["FullBook_MP3_URL"] = None
-                parsed["All_MP3s_Found"] = None
-
-            # minimal completeness validation:
-            if not parsed.get("Book_Title") or not parsed.get("Player_Link"):
-                return (
-                    "err",
-                    audio_id,
-                    "parsed record incomplete (missing title/player)",
-                    parsed,
-                )
-
-            return ("ok", audio_id, None, parsed)
-        except Exception as e:
-            return ("err", audio_id, str(e), {"AudioBook_ID": audio_id, "Source_URL": url})
+    # ---- skip IDs that already have a complete record ----
+    if merged and not force_refresh:
+        crawled = len(pairs)
+        pairs = [p for p in pairs if not (merged.get(p[0]) or {}).get("FullBook_MP3_URL")]
+        log.info(
+            "[merge] %d of %d IDs already complete; %d to fetch",
+            crawled - len(pairs), crawled, len(pairs),
+        )
 
     # ---- PASS 1 (parallel mild) ----
     success = 0
     failed = 0
     skipped = 0
 
-    # JSONL append handle for pass 1
-    jsonl_f = jsonl_path.open("a", encoding="utf-8")
-    pending_errors: List[Dict[str, Any]] = []
-
-    with ThreadPoolExecutor(max_workers=max(workers, 1)) as ex:
-        futs = [
-            ex.submit(
-                _process_one,
-                it,
-                min_mp3_size_bytes=min_mp3_size_bytes,
-                require_full_mp3=require_full_mp3,
-                cache=cache,
-            )
-            for it in pairs
-        ]
-        for fut in as_completed(futs):
-            status, audio_id, msg, parsed = fut.result()
-            if status == "ok":
-                success += 1
-                merged[int(parsed["AudioBook_ID"])] = parsed
-                io.atomic_write_csv(books_csv, list(merged.values()), details.CSV_FIELDS)
-                jsonl_f.write(json.dumps(parsed, ensure_ascii=False) + "\n")
-                jsonl_f.flush()
-                logging.info(
-                    f"✓ {parsed.get('AudioBook_ID')}  «{(parsed.get('Book_Title') or '')[:40]}»"
-                )
-            elif status == "skipped":
-                skipped += 1
-                pending_errors.append(
-                    {
-                        "AudioBook_ID": audio_id,
-                        "URL": parsed.get("Source_URL", ""),
-                        "Error": msg,
-                    }
-                )
-                logging.info(f"— skipped {audio_id}: {msg}")
-            else:
-                failed += 1
-                pending_errors.append(
-                    {
-                        "AudioBook_ID": audio_id,
-                        "URL": parsed.get("Source_URL", ""),
-                        "Error": msg,
-                    }
-                )
-                logging.error(f"✗ {audio_id}: {msg}")
-            throttle(tmin, tmax)
-
-    jsonl_f.close()
-
-    # write errors for pass 1 (UTF-8-SIG for Persian readability)
-    if pending_errors:
-        with errors_csv.open("w", newline="", encoding="utf-8-sig") as ef:
-            writer = csv.DictWriter(ef, fieldnames=["AudioBook_ID", "URL", "Error"])
-            writer.writeheader()
-            for row in pending_errors:
-                writer.writerow(row)
+    # books CSV: append per row, consolidate every `checkpoint_every` rows
+    books = io.CheckpointedCsv(books_csv, details.CSV_FIELDS, merged, checkpoint_every)
 
-    log.info(
-        f"[pass 1] Success: {success} | Skipped: {skipped} | Failed: {failed} | Total: {len(pairs)}"
-    )
+    # JSONL append handle shared by pass 1 and the sweeps; flushed on close
+    jsonl_f = jsonl_path.open("ab", buffering=1 << 20)
+    # errors.csv for pass 1 is written as failures arrive (UTF-8-SIG for Persian readability)
+    err_f = errors_csv.open("w", newline="", encoding="utf-8-sig")
+    err_writer = csv.DictWriter(err_f, fieldnames=ERROR_FIELDS)
+    err_writer.writeheader()
 
-    # ---- SWEEPS: up to 2 more passes over errors.csv ----
-    MAX_SWEEPS = 2
-    for sweep in range(1, MAX_SWEEPS + 1):
-        try:
-            err_df = pd.read_csv(errors_csv, encoding="utf-8-sig")
-        except Exception:
-            err_df = None
+    # bound once; the loops below run per item
+    info, warning, error = log.info, log.warning, log.error
+    dumps, write_jsonl = orjson.dumps, jsonl_f.write
+    write_err, flush_err = err_writer.writerow, err_f.flush
+    add_book = books.add
+    try:
+        worker = partial(
+            _process_one,
+            min_mp3_size_bytes=min_mp3_size_bytes,
+            require_full_mp3=require_full_mp3,
+            cache=cache,
+            limiter=RateLimiter(tmin, tmax),
+            cpu_pool=cpu_pool,
+        )
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as ex:
+            results = _iter_completed(ex, worker, pairs, max(workers, 1) * 4)
+            for status, audio_id, msg, parsed in results:
+                if status == "ok":
+                    success += 1
+                    add_book(int(parsed["AudioBook_ID"]), parsed)
+                    write_jsonl(dumps(parsed) + b"\n")
+                    info(
+                        "✓ %s  «%.40s»", parsed.get("AudioBook_ID"), parsed.get("Book_Title") or ""
+                    )
+                elif status == "skipped":
+                    skipped += 1
+                    write_err(
+                        {
+                            "AudioBook_ID": audio_id,
+                            "URL": parsed.get("Source_URL", ""),
+                            "Error": msg,
+                        }
+                    )
+                    flush_err()
+                    info("— skipped %s: %s", audio_id, msg)
+                else:
+                    failed += 1
+                    write_err(
+                        {
+                            "AudioBook_ID": audio_id,
+                            "URL": parsed.get("Source_URL", ""),
+                            "Error": msg,
+                        }
+                    )
+                    flush_err()
+                    error("✗ %s: %s", audio_id, msg)
 
-        if err_df is None or err_df.empty:
-            logging.info(f"[sweep] no errors to retry; stopping.")
-            break
+        err_f.close()
 
-        to_retry: List[Tuple[int, str]] = [
-            (int(r["AudioBook_ID"]), str(r["URL"]))
-            for _, r in err_df.iterrows()
-            if pd.notna(r["URL"])
-        ]
-        logging.info(
-            f"[sweep {sweep}] retrying {len(to_retry)} items… (serial, stronger backoff)"
+        log.info(
+            "[pass 1] Success: %d | Skipped: %d | Failed: %d | Total: %d",
+            success, skipped, failed, len(pairs),
         )
 
-        # stronger throttle: slower than pass 1
-        sweep_min = max(tmin * 3, 1.0)
-        sweep_max = max(tmax * 6, sweep_min + 0.5)
-
-        new_errors: List[Dict[str, Any]] = []
-        for item in to_retry:
-            status, audio_id, msg, parsed = _process_one(
-                item,
-                min_mp3_size_bytes=min_mp3_size_bytes,
-                require_full_mp3=require_full_mp3,
-                cache=cache,
+        # ---- SWEEPS: up to 2 more passes over errors.csv ----
+        MAX_SWEEPS = 2
+        for sweep in range(1, MAX_SWEEPS + 1):
+            to_retry: List[Tuple[int, str]] = []
+            try:
+                if errors_csv.stat().st_size:
+                    with errors_csv.open(newline="", encoding="utf-8-sig") as ef:
+                        to_retry = [
+                            (int(r["AudioBook_ID"]), r["URL"])
+                            for r in csv.DictReader(ef)
+                            if r.get("URL")
+                        ]
+            except Exception:
+                to_retry = []
+
+            if not to_retry:
+                logging.info("[sweep] no errors to retry; stopping.")
+                break
+
+            logging.info(
+                "[sweep %d] retrying %d items… (serial, stronger backoff)", sweep, len(to_retry)
             )
-            if status == "ok":
-                success += 1
-                merged[int(parsed["AudioBook_ID"])] = parsed
-                io.atomic_write_csv(books_csv, list(merged.values()), details.CSV_FIELDS)
-                with jsonl_path.open("a", encoding="utf-8") as jf:
-                    jf.write(json.dumps(parsed, ensure_ascii=False) + "\n")
-                logging.info(f"[sweep {sweep}] ✓ {parsed.get('AudioBook_ID')}")
-            else:
-                new_errors.append(
-                    {
-                        "AudioBook_ID": audio_id,
-                        "URL": parsed.get("Source_URL", "") if isinstance(parsed, dict) else "",
-                        "Error": msg,
-                    }
-                )
-                logging.warning(f"[sweep {sweep}] ✗ {audio_id}: {msg}")
-            throttle(sweep_min, sweep_max)
-
-        # rewrite errors.csv with remaining (UTF-8-SIG)
-        with errors_csv.open("w", newline="", encoding="utf-8-sig") as ef:
-            writer = csv.DictWriter(ef, fieldnames=["AudioBook_ID", "URL", "Error"])
-            writer.writeheader()
-            for row in new_errors:
-                writer.writerow(row)
-
-        if not new_errors:
-            logging.info(f"[sweep {sweep}] all errors resolved; stopping.")
-            break
 
+            # stronger throttle: slower than pass 1
+            sweep_min = max(tmin * 3, 1.0)
+            sweep_max = max(tmax * 6, sweep_min + 0.5)
+
+            sweep_worker = partial(worker, limiter=RateLimiter(sweep_min, sweep_max))
+            new_errors: List[Dict[str, Any]] = []
+            for item in to_retry:
+                status, audio_id, msg, parsed = sweep_worker(item)
+                if status == "ok":
+                    success += 1
+                    add_book(int(parsed["AudioBook_ID"]), parsed)
+                    write_jsonl(dumps(parsed) + b"\n")
+                    info("[sweep %d] ✓ %s", sweep, parsed.get("AudioBook_ID"))
+                else:
+                    new_errors.append(
+                        {
+                            "AudioBook_ID": audio_id,
+                            "URL": parsed.get("Source_URL", "") if isinstance(parsed, dict) else "",
+                            "Error": msg,
+                        }
+                    )
+                    warning("[sweep %d] ✗ %s: %s", sweep, audio_id, msg)
+
+            # swap in the remaining errors atomically (UTF-8-SIG)
+            io.atomic_write_csv(errors_csv, new_errors, ERROR_FIELDS)
+
+            if not new_errors:
+                logging.info("[sweep %d] all errors resolved; stopping.", sweep)
+                break
+
+    finally:
+        # final consolidated checkpoint, also on Ctrl-C / crash
+        books.close()
+        jsonl_f.close()
+        err_f.close()
+
+    if cpu_pool:
+        cpu_pool.shutdown()
+
+    remaining = 0
+    if errors_csv.exists():
+        with errors_csv.open(newline="", encoding="utf-8-sig") as ef:
+            remaining = max(sum(1 for _ in csv.reader(ef)) - 1, 0)
     log.info(
-        f"✅ Done. Success (incl. sweeps): {success} | Remaining errors: "
-        f"{0 if not errors_csv.exists() else pd.read_csv(errors_csv, encoding='utf-8-sig').shape[0]} | Total initial IDs: {len(pairs)}"
+        "✅ Done. Success (incl. sweeps): %d | Remaining errors: %d | Total initial IDs: %d",
+        success,
+        remaining,
+        len(pairs),
     )
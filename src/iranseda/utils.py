@@ -1,8 +1,22 @@
 
 from __future__ import annotations
-import logging, time, random, functools, hashlib
+import logging, time, random, functools, threading, sqlite3
+from collections import OrderedDict
 from pathlib import Path
 from typing import Callable, Any, Optional
+from urllib.parse import urljoin
+
+import zstandard
+
+BASE = "https://book.iranseda.ir/"
+
+@functools.lru_cache(maxsize=65536)
+def fix_url(u: str) -> str:
+    """Absolute URL for an href/src found on book.iranseda.ir (memoized: inputs repeat a lot)."""
+    u = u.strip()
+    if u.startswith("http"):
+        return u
+    return urljoin(BASE, u.lstrip("./"))
 
 def setup_logging(logfile: Path | None, level: str = "INFO") -> None:
     logger = logging.getLogger()
@@ -21,6 +35,22 @@ def setup_logging(logfile: Path | None, level: str = "INFO") -> None:
 def throttle(min_s: float, max_s: float) -> None:
     time.sleep(random.uniform(min_s, max_s))
 
+class RateLimiter:
+    """Thread-safe pacing: hands out one request slot every uniform(min_s, max_s) seconds."""
+    def __init__(self, min_s: float, max_s: float):
+        self.min_s = min_s
+        self.max_s = max_s
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + random.uniform(self.min_s, self.max_s)
+        if slot > now:
+            time.sleep(slot - now)
+
 def retry(max_attempts: int = 3, base_delay: float = 0.5, factor: float = 2.0, jitter: float = 0.2):
     """Decorator: retry with exponential backoff + jitter."""
     def deco(fn: Callable[..., Any]):
@@ -36,30 +66,80 @@ def retry(max_attempts: int = 3, base_delay: float = 0.5, factor: float = 2.0, j
                     if attempt >= max_attempts:
                         raise
                     sleep_for = delay + random.uniform(0, jitter)
-                    logging.getLogger().warning(f"{fn.__name__}: attempt {attempt} failed ({e}); retrying in {sleep_for:.2f}s")
+                    logging.getLogger().warning(
+                        "%s: attempt %d failed (%s); retrying in %.2fs", fn.__name__, attempt, e, sleep_for
+                    )
                     time.sleep(sleep_for)
                     delay *= factor
         return wrapped
     return deco
 
 class DiskCache:
-    def __init__(self, base: Path):
+    """URL -> HTML store in one SQLite file (`<base>/cache.sqlite3`), bodies zstd-compressed.
+
+    The last `mem_items` pages are also kept in RAM (detail pages are ~50-100 KB,
+    so the default 512 costs roughly 25-50 MB); 0 disables the memory tier.
+    """
+    def __init__(self, base: Path, mem_items: int = 512):
         self.base = Path(base)
         self.base.mkdir(parents=True, exist_ok=True)
+        self.path = self.base / "cache.sqlite3"
+        self._local = threading.local()
+        self._mem: OrderedDict[str, str] = OrderedDict()
+        self._mem_items = mem_items
+        self._mem_lock = threading.Lock()
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS cache (url TEXT PRIMARY KEY, fetched_at INTEGER, body BLOB)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets readers proceed while another thread writes."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.executescript(
+                "PRAGMA journal_mode=WAL;"
+                "PRAGMA synchronous=NORMAL;"
+                "PRAGMA temp_store=MEMORY;"
+                "PRAGMA page_size=4096;"
+                "PRAGMA cache_size=-8192;"
+            )
+            self._local.conn = conn
+            # zstd contexts are not thread-safe, so they live next to the connection
+            self._local.cctx = zstandard.ZstdCompressor(level=3)
+            self._local.dctx = zstandard.ZstdDecompressor()
+        return conn
 
-    def key_for(self, url: str) -> Path:
-        h = hashlib.sha1(url.encode("utf-8")).hexdigest()
-        return self.base / f"{h}.html"
+    def _remember(self, url: str, html: str) -> None:
+        if self._mem_items <= 0:
+            return
+        with self._mem_lock:
+            self._mem[url] = html
+            self._mem.move_to_end(url)
+            if len(self._mem) > self._mem_items:
+                self._mem.popitem(last=False)
 
     def get(self, url: str) -> Optional[str]:
-        p = self.key_for(url)
-        if p.exists():
-            try:
-                return p.read_text(encoding="utf-8")
-            except Exception:
-                return None
-        return None
+        with self._mem_lock:
+            html = self._mem.get(url)
+            if html is not None:
+                self._mem.move_to_end(url)
+                return html
+        try:
+            row = self._connect().execute("SELECT body FROM cache WHERE url = ?", (url,)).fetchone()
+            html = self._local.dctx.decompress(row[0]).decode("utf-8") if row else None
+        except Exception:
+            return None
+        if html is not None:
+            self._remember(url, html)
+        return html
 
     def set(self, url: str, html: str) -> None:
-        p = self.key_for(url)
-        p.write_text(html, encoding="utf-8")
+        conn = self._connect()
+        body = self._local.cctx.compress(html.encode("utf-8"))
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (url, fetched_at, body) VALUES (?, ?, ?)",
+            (url, int(time.time()), body),
+        )
+        conn.commit()
+        self._remember(url, html)
@@ -1,12 +1,32 @@
 
 import json
-from iranseda.details import get_mp3s_from_api
+from iranseda.details import get_mp3s_from_api, pick_mp3s
 
 def test_api_parsing_monkeypatch(monkeypatch):
     class Resp:
         status_code = 200
-        def json(self): return {"items": [{"FileID": 1, "download": [{"extension": "mp3", "downloadUrl": "https://player.iranseda.ir/downloadfile/?attid=111&q=11", "fileSize": 12345, "bitRate": 64}, {"extension": "mp3", "downloadUrl": "https://player.iranseda.ir/downloadfile/?attid=111&q=12", "fileSize": 22345, "bitRate": 128}]}]}
+        payload = {"items": [{"FileID": 1, "download": [{"extension": "mp3", "downloadUrl": "https://player.iranseda.ir/downloadfile/?attid=111&q=11", "fileSize": 12345, "bitRate": 64}, {"extension": "mp3", "downloadUrl": "https://player.iranseda.ir/downloadfile/?attid=111&q=12", "fileSize": 22345, "bitRate": 128}]}]}
+        content = json.dumps(payload).encode("utf-8")
+        def json(self): return self.payload
     monkeypatch.setattr("iranseda.details.req_get", lambda url: Resp())
     mp3s = get_mp3s_from_api(1, 1)
     assert len(mp3s) == 2
     assert mp3s[0]["url"].startswith("https://")
+
+def test_pick_mp3s_filters_and_dedups():
+    a = {"url": "https://player.iranseda.ir/downloadfile/?attid=111&q=11", "size": 12345, "bitrate": 64}
+    b = {"url": "https://player.iranseda.ir/downloadfile/?attid=111&q=12", "size": 22345, "bitrate": 128}
+    best, urls = pick_mp3s([a, b, dict(a)])
+    assert best is b
+    assert urls == [a["url"], b["url"]]
+    best, urls = pick_mp3s([a, b], min_size=20000)
+    assert best is b and urls == [b["url"]]
+    assert pick_mp3s([a], min_size=20000) == (None, [])
+
+def test_api_parsing_bom_falls_back_to_requests_json(monkeypatch):
+    import requests
+    r = requests.Response()
+    r.status_code = 200
+    r._content = b"\xef\xbb\xbf" + json.dumps({"items": [{"download": [{"extension": "MP3", "downloadUrl": "https://player.iranseda.ir/downloadfile/?attid=111&q=11", "fileSize": 1, "bitRate": 32}]}]}).encode("utf-8")
+    monkeypatch.setattr("iranseda.details.req_get", lambda url: r)
+    assert [m["size"] for m in get_mp3s_from_api(1, 1)] == [1]
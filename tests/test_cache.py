@@ -0,0 +1,18 @@
+
+from iranseda.utils import DiskCache
+
+def test_disk_cache_roundtrip(tmp_path):
+    cache = DiskCache(tmp_path)
+    url = "https://book.iranseda.ir/DetailsAlbum/?VALID=TRUE&g=644848"
+    assert cache.get(url) is None
+    cache.set(url, "<h1 class='titel'>اسپارتاکوس</h1>")
+    cache.set(url, "<h1 class='titel'>اسپارتاکوس ۲</h1>")
+    assert DiskCache(tmp_path).get(url) == "<h1 class='titel'>اسپارتاکوس ۲</h1>"
+
+def test_disk_cache_memory_tier_evicts_oldest(tmp_path):
+    cache = DiskCache(tmp_path, mem_items=2)
+    for g in (1, 2, 3):
+        cache.set(f"u{g}", f"<p>{g}</p>")
+    assert list(cache._mem) == ["u2", "u3"]
+    assert cache.get("u1") == "<p>1</p>"  # served from SQLite, then remembered
+    assert list(cache._mem) == ["u3", "u1"]
@@ -0,0 +1,16 @@
+
+import csv
+from iranseda.io import CheckpointedCsv
+
+def test_checkpointed_csv_appends_and_consolidates(tmp_path):
+    out = tmp_path / "books.csv"
+    rows = {}
+    w = CheckpointedCsv(out, ["AudioBook_ID", "Book_Title"], rows, checkpoint_every=2)
+    w.add(1, {"AudioBook_ID": 1, "Book_Title": "الف"})
+    w.add(2, {"AudioBook_ID": 2, "Book_Title": "ب"})
+    w.add(1, {"AudioBook_ID": 1, "Book_Title": "الف ۲"})
+    w.close()
+    with out.open(newline="", encoding="utf-8-sig") as f:
+        got = list(csv.DictReader(f))
+    assert [r["AudioBook_ID"] for r in got] == ["1", "2"]
+    assert got[0]["Book_Title"] == "الف ۲"